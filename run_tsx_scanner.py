@@ -1,120 +1,80 @@
 # app.py — TSX scanner robuste (sans read_html), avec diagnostics immédiats
-import io, re, time, csv
-from typing import List, Optional
+import io, os, time
+from collections import deque
+from datetime import date
+from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import requests
 import streamlit as st
-import yfinance as yf
+
+import tsx_core as core
 
 # ----------------------------- CONFIG -----------------------------
 st.set_page_config(page_title="TSX — 3 Rouges + 1 Vert (Heikin-Ashi)", layout="wide")
 st.title("🇨🇦 S&P/TSX — Détection 3 rouges puis 1 vert (Heikin-Ashi)")
 
+BATCH_SIZE = 100  # tickers par appel yf.download
+CHART_BARS = 90   # barres affichées sur le graphique final
+LOG_MAX = 500     # lignes de journal conservées dans la session
+
 # Affiche une bannière de diagnostic dès le départ
 st.info("App chargée. Si rien ne s'affiche ensuite, ouvre le volet 'Journaux' plus bas.")
 
 if "logs" not in st.session_state:
-    st.session_state.logs = []
+    st.session_state.logs = deque(maxlen=LOG_MAX)  # tampon circulaire : les plus anciennes sont évincées
+# Résultat du dernier scan : survit aux reruns (ex. changement de ticker dans le graphique)
+if "detected" not in st.session_state:
+    st.session_state.detected = None
 def log(msg: str) -> None:
     st.session_state.logs.append(msg)
 
 # ----------------------------- HELPERS -----------------------------
-def _normalize_tsx(symbols: List[str]) -> List[str]:
-    out = []
-    for s in symbols:
-        s = str(s).strip().upper().replace(" ", "")
-        if not s or s in {"NAN", "NONE"}:
-            continue
-        s = re.sub(r"^[A-Z]+:", "", s)             # TSX:RY -> RY
-        s = re.sub(r"[:\.](CN|XTSE|TSE)$", "", s)  # :CN/.CN/.XTSE etc.
-        s = s.replace(".UN", "-UN").replace(".U", "-U")
-        if not s.endswith(".TO"):
-            s = f"{s}.TO"
-        if re.fullmatch(r"[A-Z0-9\-\.]{1,12}\.TO", s):
-            out.append(s)
-    return sorted(set(out))
-
-def _http_get(url: str, timeout: int = 15) -> requests.Response:
-    headers = {
-        "User-Agent": ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
-                       "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"),
-        "Accept-Language": "en,fr;q=0.9",
-        "Cache-Control": "no-cache",
-        "Pragma": "no-cache",
-    }
-    resp = requests.get(url, headers=headers, timeout=timeout)
-    resp.raise_for_status()
-    return resp
-
-def _read_blackrock_xic_tickers() -> Optional[List[str]]:
-    """
-    Lit le CSV holdings XIC (BlackRock) SANS read_html:
-    - détecte la ligne d'entête
-    - sniff du délimiteur
-    - retourne une liste normalisée .TO
-    """
-    url = (
-        "https://www.blackrock.com/ca/investors/en/products/239837/"
-        "ishares-sptsx-capped-composite-index-etf/1464253357814.ajax"
-        "?dataType=fund&fileName=XIC_holdings&fileType=csv"
-    )
+# persist="disk" ignore ttl : la date `asof` fait partie de la clé de cache et
+# l'invalide chaque jour, y compris après un redémarrage. Les échecs lèvent une
+# exception dans les fonctions cachées : st.cache_data ne les met pas en cache,
+# donc une panne passagère n'est jamais figée jusqu'au lendemain.
+CACHE_DAYS = 7  # les fichiers .memo plus anciens sont périmés (clé journalière)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _prune_disk_cache(asof: str) -> None:
+    """max_entries ne borne que la couche mémoire : purge du disque une fois par jour et par processus."""
+    # Module interne de Streamlit : s'il disparaît, seule la purge est perdue, pas l'app
     try:
-        r = _http_get(url, timeout=15)  # timeout court pour éviter une longue attente
-        text = r.content.decode("utf-8-sig", errors="replace")
-        lines = text.splitlines()
-        header_idx = None
-        header_candidates = {"ticker", "symbol", "holding ticker", "holding symbol"}
-        for i, line in enumerate(lines[:200]):
-            if any(h in line.lower() for h in header_candidates):
-                header_idx = i
-                break
-        if header_idx is None:
-            for i, line in enumerate(lines[:300]):
-                if line.count(",") >= 3 or line.count(";") >= 3 or line.count("\t") >= 3:
-                    header_idx = i
-                    break
-        if header_idx is None:
-            log("[XIC CSV] entête introuvable")
-            return None
-
-        body_text = "\n".join(lines[header_idx:])
-        try:
-            dialect = csv.Sniffer().sniff("\n".join(body_text.splitlines()[:2]))
-            sep = dialect.delimiter
-        except Exception:
-            sep = ","
-
-        df = pd.read_csv(io.StringIO(body_text), sep=sep, engine="python")
-        col = None
-        for c in df.columns:
-            if str(c).strip().lower() in {"ticker", "symbol", "holding ticker", "holding symbol"}:
-                col = c
-                break
-        if col is None:
-            log("[XIC CSV] colonne ticker/symbol introuvable")
-            return None
-
-        syms = df[col].dropna().astype(str).tolist()
-        norm = _normalize_tsx(syms)
-        if len(norm) >= 150:
-            return norm
-        log(f"[XIC CSV] trop peu de tickers ({len(norm)})")
-        return None
-    except Exception as e:
-        log(f"[XIC CSV] {type(e).__name__}: {e}")
-        return None
-
-@st.cache_data(ttl=24*60*60)
-def get_tsx_universe() -> List[str]:
+        from streamlit.runtime.caching.storage.local_disk_cache_storage import get_cache_folder_path
+        folder = get_cache_folder_path()
+        if not os.path.isdir(folder):  # pas encore de cache disque
+            return
+        cutoff = time.time() - CACHE_DAYS * 24 * 60 * 60
+        for entry in os.scandir(folder):
+            try:  # une autre session peut supprimer le fichier entre-temps
+                if entry.name.endswith(".memo") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+    except (ImportError, OSError) as e:
+        log(f"[cache] purge disque ignorée : {type(e).__name__}: {e}")
+
+@st.cache_data(persist="disk", max_entries=CACHE_DAYS, show_spinner=False)
+def _xic_tickers(asof: str) -> List[str]:
+    # Corps brut jamais mis en cache : seule la liste validée (>= 150 tickers) l'est
+    content = core.http_get(core.XIC_URL, timeout=15).content  # timeout court pour éviter une longue attente
+    norm = core.read_xic_tickers(io.BytesIO(content))
+    if len(norm) < 150:
+        raise ValueError(f"trop peu de tickers ({len(norm)})")
+    return norm
+
+def get_tsx_universe(asof: str) -> List[str]:
     # 1) BlackRock XIC
-    tickers = _read_blackrock_xic_tickers()
-    if tickers:
+    try:
+        tickers = _xic_tickers(asof)
         st.caption("✅ Univers via BlackRock XIC (CSV holdings).")
         return tickers
+    except Exception as e:
+        log(f"[XIC CSV] {type(e).__name__}: {e}")
 
-    # 2) Repli codé en dur : TSX-60
+    # 2) Repli codé en dur : TSX-60 (jamais mis en cache)
     tsx60 = [
         "RY.TO","TD.TO","BNS.TO","BMO.TO","CM.TO","NA.TO","MFC.TO","SLF.TO","GWO.TO","IFC.TO",
         "CNQ.TO","SU.TO","ENB.TO","TRP.TO","TOU.TO","CVE.TO","IMO.TO","POU.TO","ARX.TO","PPL.TO",
@@ -126,48 +86,62 @@ def get_tsx_universe() -> List[str]:
         "DOL.TO","L.TO","WN.TO","ATZ.TO","TRI.TO","QSR.TO","EMP-A.TO","CTC-A.TO",
     ]
     st.info("ℹ️ Univers Composite indisponible — repli **S&P/TSX 60** (liste interne).")
-    return sorted(set(tsx60))
+    return list(dict.fromkeys(tsx60))
 
-@st.cache_data
-def download_data(ticker: str, period: str = "3mo") -> Optional[pd.DataFrame]:
-    try:
-        df = yf.download(
-            ticker, period=period, interval="1d",
-            progress=False, auto_adjust=False, group_by="column", threads=True
-        )
-    except Exception as e:
-        log(f"[yfinance] {ticker}: {type(e).__name__}: {e}")
-        return None
+# float32 suffit pour comparer des prix, et divise par deux la taille du cache
+_OHLC_FLOAT32 = dict.fromkeys(core.OHLC, "float32")
 
+@st.cache_data(persist="disk", max_entries=128, show_spinner=False)
+def _download_data(ticker: str, period: str, asof: str) -> pd.DataFrame:
+    import yfinance as yf  # import paresseux (~0,1 s) : seulement si un graphique est demandé
+    df = yf.download(
+        ticker, period=period, interval="1d",
+        progress=False, auto_adjust=False, group_by="column", threads=True
+    )
     if df is None or df.empty:
-        return None
+        raise LookupError("aucune donnée")
     if isinstance(df.columns, pd.MultiIndex):
         df.columns = df.columns.get_level_values(0)
-    df = df.dropna(subset=["Open", "High", "Low", "Close"])
-    return df if not df.empty else None
-
-def compute_heikin_ashi(df: pd.DataFrame) -> pd.DataFrame:
-    ha = pd.DataFrame(index=df.index)
-    ha["Close"] = (df["Open"] + df["High"] + df["Low"] + df["Close"]) / 4
-    ha_open = [(df["Open"].iloc[0] + df["Close"].iloc[0]) / 2]
-    for i in range(1, len(df)):
-        ha_open.append((ha_open[i-1] + ha["Close"].iloc[i-1]) / 2)
-    ha["Open"] = ha_open
-    ha["High"] = pd.concat([df["High"], ha["Open"], ha["Close"]], axis=1).max(axis=1)
-    ha["Low"] = pd.concat([df["Low"], ha["Open"], ha["Close"]], axis=1).min(axis=1)
-    return ha
-
-def match_pattern_last4(ha: pd.DataFrame) -> bool:
-    if len(ha) < 4:
-        return False
-    reds = ha.iloc[-4:-1]
-    green = ha.iloc[-1]
-    return (reds["Close"] < reds["Open"]).sum() == 3 and (green["Close"] > green["Open"]) and (green["Close"] > reds.iloc[-1]["Close"])
+    if df[core.OHLC].isna().to_numpy().any():  # rare en quotidien : évite la copie de dropna
+        df = df.dropna(subset=core.OHLC)
+    if df.empty:
+        raise LookupError("aucune donnée")
+    return df.astype(_OHLC_FLOAT32)
+
+class _IncompleteBatch(Exception):
+    """Lot dont au moins un ticker a échoué : résultat partiel utilisé, jamais persisté."""
+    def __init__(self, arrays: Dict[str, np.ndarray], missing: int) -> None:
+        super().__init__(f"{missing} ticker(s) sans données")
+        self.arrays = arrays
+
+@st.cache_data(persist="disk", max_entries=64, show_spinner=False)
+def _download_many(tickers: List[str], period: str, asof: str) -> Dict[str, np.ndarray]:
+    arrays = core.download_many(tickers, period=period, log=log)
+    if len(arrays) < len(tickers):  # échec total ou partiel (ex. rate limit Yahoo)
+        raise _IncompleteBatch(arrays, len(tickers) - len(arrays))
+    return arrays
+
+def download_many(tickers: List[str], period: str = "3mo", asof: str = "") -> Dict[str, np.ndarray]:
+    try:
+        return _download_many(tickers, period, asof)
+    except _IncompleteBatch as e:
+        return e.arrays  # déjà journalisé par core.download_many
+
+@st.cache_data(ttl=24*60*60, max_entries=64, show_spinner=False)
+def chart_heikin_ashi(ticker: str, period: str, asof: str) -> Tuple[pd.Index, core.HeikinAshi]:
+    """
+    Dernières CHART_BARS bougies HA, calculées une fois par (ticker, période, jour).
+    Lève une exception si le téléchargement échoue (jamais mise en cache).
+    """
+    df = _download_data(ticker, period, asof)
+    # HA calculé sur tout l'historique (récurrence), seules les dernières barres sont gardées
+    ha = core.heikin_ashi(df[core.OHLC].to_numpy())
+    last = slice(-CHART_BARS, None)
+    return df.index[last], core.HeikinAshi(*(a[last] for a in ha))
 
 # ----------------------------- UI -----------------------------
 st.sidebar.header("Configuration")
 limit_n = st.sidebar.slider("Limiter le nombre de tickers", 20, 400, 200, step=10)
-cooldown = st.sidebar.slider("Pause entre requêtes (s)", 0.0, 0.5, 0.05, step=0.05)
 period = st.sidebar.selectbox("Période de téléchargement", ["1mo", "2mo", "3mo", "6mo"], index=2)
 
 # Option upload CSV locale (aucun appel réseau)
@@ -176,9 +150,9 @@ up = st.sidebar.file_uploader("CSV custom (colonne 'Symbol' / 'Ticker' ex.: RY,
 if up is not None:
     try:
         udf = pd.read_csv(up)
-        col = next((c for c in ["Symbol", "Ticker", "Ticker symbol", "Symbole"] if c in udf.columns), None)
+        col = next((c for c in udf.columns if str(c).strip().lower() in core.WANT_COLS), None)
         if col:
-            uploaded = _normalize_tsx(udf[col].dropna().astype(str).tolist())
+            uploaded = core.normalize_tsx(udf[col].dropna().astype(str).tolist())
             st.sidebar.success(f"{len(uploaded)} tickers chargés.")
         else:
             st.sidebar.error("Colonne introuvable. Utilise 'Symbol' ou 'Ticker'.")
@@ -186,6 +160,8 @@ if up is not None:
         st.sidebar.error(f"Lecture CSV: {type(e).__name__}: {e}")
 
 go_scan = st.sidebar.button("🚦 Lancer l’analyse")
+today = date.today().isoformat()  # clé de cache journalière (barres quotidiennes)
+_prune_disk_cache(today)
 
 if go_scan:
     with st.status("Préparation de l’univers…", expanded=True) as status:
@@ -193,7 +169,7 @@ if go_scan:
             tickers = uploaded
             st.write(f"Univers = CSV upload ({len(tickers)} tickers)")
         else:
-            tickers = get_tsx_universe()
+            tickers = get_tsx_universe(today)
             st.write(f"Univers = {len(tickers)} tickers")
 
         tickers = tickers[:limit_n]
@@ -202,32 +178,37 @@ if go_scan:
     detected: List[str] = []
     prog = st.progress(0, text="Analyse des tickers…")
     total = len(tickers)
-    for i, ticker in enumerate(tickers, 1):
-        df = download_data(ticker, period=period)
-        if df is not None:
-            ha = compute_heikin_ashi(df)
-            if match_pattern_last4(ha):
-                detected.append(ticker)
-        prog.progress(i / total, text=f"Scanné: {ticker}")
-        if cooldown:
-            time.sleep(cooldown)
-
+    for start in range(0, total, BATCH_SIZE):
+        batch = tickers[start:start + BATCH_SIZE]
+        arrays = download_many(batch, period=period, asof=today)
+        detected += [t for t, ohlc in arrays.items() if core.match_pattern_fast(ohlc)]
+        done = start + len(batch)
+        prog.progress(done / total, text=f"Scanné: {done}/{total}")
+    st.session_state.detected = detected
+
+# Hors du bloc bouton : choisir un ticker relance le script sans relancer le scan
+detected = st.session_state.detected
+if detected is not None:
     st.write("---")
     if detected:
         st.success(f"🎯 {len(detected)} signal(s) détecté(s) !")
-        st.dataframe(pd.DataFrame(detected, columns=["Ticker"]), use_container_width=True)
+        st.dataframe(pd.DataFrame(detected, columns=["Ticker"]), width="stretch")
         choice = st.selectbox("📌 Afficher :", detected)
         if choice:
-            df_sel = download_data(choice, period=max(period, "3mo"))
-            if df_sel is not None:
-                ha_sel = compute_heikin_ashi(df_sel)
+            try:
+                dates, ha = chart_heikin_ashi(choice, period=max(period, "3mo"), asof=today)
+            except Exception as e:
+                log(f"[yfinance] {choice}: {type(e).__name__}: {e}")
+            else:
                 fig = go.Figure([go.Candlestick(
-                    x=ha_sel.index, open=ha_sel["Open"], high=ha_sel["High"],
-                    low=ha_sel["Low"], close=ha_sel["Close"],
+                    x=dates, open=ha.open, high=ha.high, low=ha.low, close=ha.close,
                     increasing_line_color="green", decreasing_line_color="red"
                 )])
-                fig.update_layout(title=f"Heikin-Ashi: {choice}", xaxis_title="Date", yaxis_title="Prix")
-                st.plotly_chart(fig, use_container_width=True)
+                fig.update_layout(
+                    title=f"Heikin-Ashi: {choice}", xaxis_title="Date", yaxis_title="Prix",
+                    xaxis_rangeslider_visible=False, uirevision="ha", height=500,
+                )
+                st.plotly_chart(fig, width="stretch")
     else:
         st.warning("Aucun signal trouvé.")
 
@@ -0,0 +1,189 @@
+# tsx_core.py — logique commune aux deux scanners (Streamlit et Discord)
+import atexit, csv, functools, io, re
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ----------------------------- HTTP -----------------------------
+HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"),
+    "Accept-Language": "en,fr;q=0.9",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+}
+
+# Session HTTP partagée : une seule poignée de main TCP+TLS par hôte.
+# Pas d'en-têtes navigateur au niveau de la session (le webhook Discord passe aussi par là).
+SESSION = requests.Session()
+# Réessais sur échec de connexion seulement : read=0 pour qu'un timeout de lecture
+# ne soit pas multiplié (le repli TSX-60 de l'app doit rester rapide)
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                       max_retries=Retry(total=3, connect=3, read=0, backoff_factor=0.5))
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+atexit.register(SESSION.close)
+
+def http_get(url: str, timeout: int = 15, stream: bool = False) -> requests.Response:
+    resp = SESSION.get(url, headers=HEADERS, timeout=timeout, stream=stream)
+    resp.raise_for_status()
+    return resp
+
+# ----------------------------- TICKERS -----------------------------
+_PREFIX = re.compile(r"^[A-Z]+:")                 # TSX:RY -> RY
+_SUFFIX = re.compile(r"[:.](?:CN|XTSE|TSE)$")     # :CN/.CN/.XTSE etc.
+_TSX_OK = re.compile(r"[A-Z0-9\-.]{1,12}\.TO")
+_HEADER_RE = re.compile(r"ticker|symbol", re.IGNORECASE)
+# Noms de colonne (en minuscules) acceptés pour la liste de symboles
+WANT_COLS = frozenset({"ticker", "symbol", "holding ticker", "holding symbol", "ticker symbol", "symbole"})
+
+XIC_URL = (
+    "https://www.blackrock.com/ca/investors/en/products/239837/"
+    "ishares-sptsx-capped-composite-index-etf/1464253357814.ajax"
+    "?dataType=fund&fileName=XIC_holdings&fileType=csv"
+)
+
+@functools.lru_cache(maxsize=4096)
+def _norm_one(s: str) -> Optional[str]:
+    """Normalise un symbole brut pour Yahoo (.TO), ou None s'il est invalide."""
+    s = s.strip().upper().replace(" ", "")
+    if not s or s in {"NAN", "NONE"}:
+        return None
+    s = _PREFIX.sub("", s)
+    s = _SUFFIX.sub("", s)
+    s = s.replace(".U", "-U")                  # .UN -> -UN, .U -> -U
+    if not s.endswith(".TO"):
+        s = f"{s}.TO"
+    return s if _TSX_OK.fullmatch(s) else None
+
+def normalize_tsx(symbols: List[str]) -> List[str]:
+    return list(dict.fromkeys(filter(None, (_norm_one(str(s)) for s in symbols))))
+
+def read_xic_tickers(raw: BinaryIO) -> List[str]:
+    """
+    Lit le CSV holdings XIC (BlackRock) depuis un flux binaire, sans read_html :
+    - lit ligne à ligne jusqu'à l'entête ticker/symbol (200 premières lignes)
+    - passe le reste du flux tel quel à pandas, en ne gardant que cette colonne
+    - retourne une liste normalisée .TO
+    Lève ValueError si l'entête ou la colonne est introuvable.
+    """
+    stream = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace")
+    header = None
+    for _ in range(200):
+        line = stream.readline()
+        if not line:
+            break
+        if _HEADER_RE.search(line):
+            header = line
+            break
+    if header is None:
+        raise ValueError("entête introuvable")
+
+    # Le CSV BlackRock est toujours séparé par des virgules : pas de csv.Sniffer
+    names = next(csv.reader([header]))
+    col = next((c for c in names if c.strip().lower() in WANT_COLS), None)
+    if col is None:
+        raise ValueError("colonne ticker/symbol introuvable")
+
+    df = pd.read_csv(stream, sep=",", header=None, names=names, usecols=[col],
+                     dtype="string", on_bad_lines="skip")
+    return normalize_tsx(df[col].dropna().tolist())
+
+# ----------------------------- DONNÉES -----------------------------
+OHLC = ["Open", "High", "Low", "Close"]
+
+def download_many(tickers: List[str], period: str = "3mo",
+                  log: Callable[[str], None] = print) -> Dict[str, np.ndarray]:
+    """
+    Télécharge un lot de tickers en un seul appel yfinance (group_by="ticker")
+    et le convertit une seule fois en tableaux OHLC (n, 4) float32 par ticker,
+    sans indexation pandas par ticker. Les tickers sans données (échec ou
+    limitation yfinance sur une partie du lot) sont absents et journalisés.
+    """
+    import yfinance as yf  # import paresseux (~0,1 s) : seulement au premier scan
+    try:
+        data = yf.download(
+            " ".join(tickers), period=period, interval="1d",
+            progress=False, auto_adjust=False, group_by="ticker", threads=True
+        )
+    except Exception as e:
+        log(f"[yfinance] lot de {len(tickers)}: {type(e).__name__}: {e}")
+        return {}
+
+    if data is None or data.empty:
+        log(f"[yfinance] lot de {len(tickers)}: aucune donnée")
+        return {}
+    if not isinstance(data.columns, pd.MultiIndex):
+        data = pd.concat({tickers[0]: data}, axis=1)
+    cols = pd.MultiIndex.from_product([tickers, OHLC])
+    block = data.reindex(columns=cols).to_numpy(dtype=np.float32).reshape(len(data), len(tickers), 4)
+    out: Dict[str, np.ndarray] = {}
+    for i, t in enumerate(tickers):
+        ohlc = block[:, i]
+        gaps = np.isnan(ohlc).any(axis=1)
+        if gaps.any():  # rare en quotidien : sinon on garde la vue, sans copie
+            ohlc = ohlc[~gaps]
+        if len(ohlc):
+            out[t] = ohlc
+    # yfinance >= 1.x ne remonte plus ses erreurs par ticker (shared._ERRORS reste vide) :
+    # un ticker demandé sans aucune barre est compté comme un échec
+    missing = [t for t in tickers if t not in out]
+    if missing:
+        log(f"[yfinance] {len(missing)} ticker(s) sans données: {', '.join(missing)}")
+    return out
+
+# ----------------------------- HEIKIN-ASHI -----------------------------
+# Au-delà de 64 barres, l'influence d'une valeur sur ha_open (1/2^k) est sous la précision float64
+HA_WINDOW = 64
+# Poids 1/2^k de ha_close[i-k] dans ha_open[i], k = 1..HA_WINDOW
+_HA_DECAY = 0.5 ** np.arange(1, HA_WINDOW + 1)
+
+def _ha_open(seed: float, ha_close: np.ndarray) -> np.ndarray:
+    """
+    Forme fermée de ha_open[i] = (ha_open[i-1] + ha_close[i-1]) / 2 :
+    ha_open[i] = seed/2^i + somme des ha_close[i-k]/2^k, calculée par convolution.
+    """
+    n = len(ha_close)
+    out = seed * 0.5 ** np.arange(n, dtype=ha_close.dtype)
+    out[1:] += np.convolve(ha_close, _HA_DECAY.astype(ha_close.dtype))[:n - 1]
+    return out
+
+class HeikinAshi(NamedTuple):
+    """Bougies Heikin-Ashi en colonnes NumPy séparées (une par champ)."""
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+def _ha_open_close(ohlc: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    o, h, l, c = ohlc.T
+    ha_close = (o + h + l + c) / 4
+    return _ha_open((o[0] + c[0]) / 2, ha_close), ha_close
+
+def heikin_ashi(ohlc: np.ndarray) -> HeikinAshi:
+    """Heikin-Ashi complet à partir des OHLC bruts (n, 4)."""
+    ha_open, ha_close = _ha_open_close(ohlc)
+    return HeikinAshi(
+        open=ha_open,
+        high=np.maximum.reduce([ohlc[:, 1], ha_open, ha_close]),
+        low=np.minimum.reduce([ohlc[:, 2], ha_open, ha_close]),
+        close=ha_close,
+    )
+
+def match_pattern_fast(ohlc: np.ndarray) -> bool:
+    """
+    3 rouges puis 1 vert, testé directement sur les OHLC bruts (n, 4).
+    Seuls ha_open/ha_close sont calculés : pas de DataFrame Heikin-Ashi.
+    """
+    if len(ohlc) < 4:
+        return False
+    # La graine de ha_open au début de la fenêtre pèse 1/2^60 sur la 4e avant-dernière barre
+    ha_open, ha_close = _ha_open_close(ohlc[-HA_WINDOW:])
+    # Comparaisons scalaires : la plupart des tickers échouent dès la première
+    return bool(ha_close[-4] < ha_open[-4] and ha_close[-3] < ha_open[-3]
+                and ha_close[-2] < ha_open[-2]
+                and ha_close[-1] > ha_open[-1] and ha_close[-1] > ha_close[-2])